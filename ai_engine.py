@@ -2,47 +2,106 @@
 Модуль для работы с Google Gemini API.
 Генерирует идеи и контент на основе профиля бренда.
 """
+import asyncio
+import functools
+import json
 import os
-import google.generativeai as genai
+import re
+import string
+import threading
+import time
+from datetime import timedelta
 from dotenv import load_dotenv
 from brand_data import get_brand_context_string
+from llm_cache import LLMCache, SemanticCache, cache_key
 
-# Загружаем переменные окружения из различных источников
-# Приоритет: env.local > .env.local > .env > системные переменные
-# Также поддерживаем переменные окружения Streamlit Cloud
-env_files = ['env.local', '.env.local', '.env']
-api_key = None
+@functools.lru_cache(maxsize=1)
+def get_api_key():
+    """
+    Находит API ключ Gemini (один раз за процесс).
+    
+    Приоритет: системные переменные (например, Streamlit Cloud) >
+    env.local > .env.local > .env.
+    
+    Returns:
+        str: API ключ или None, если он не найден.
+    """
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if api_key and len(api_key) > 10:  # Проверяем, что ключ не пустой
+        return api_key
+    
+    # Файлы окружения для локальной разработки
+    for env_file in ('env.local', '.env.local', '.env'):
+        if os.path.exists(env_file):
+            load_dotenv(env_file, override=True)
+            api_key = os.getenv('GEMINI_API_KEY')
+            if api_key and len(api_key) > 10:
+                return api_key
+    
+    # Последняя попытка: поиск .env по умолчанию
+    load_dotenv()
+    return os.getenv('GEMINI_API_KEY') or None
+
+
+# Файл, в котором запоминается найденная модель, чтобы не искать ее при каждом запуске
+GEMINI_MODEL_FILE = ".gemini_model"
 
-# Сначала пробуем файлы (для локальной разработки)
-for env_file in env_files:
-    if os.path.exists(env_file):
-        load_dotenv(env_file, override=True)
-        api_key = os.getenv('GEMINI_API_KEY')
-        if api_key and len(api_key) > 10:  # Проверяем, что ключ не пустой
-            break
+_genai = None
 
-# Если не нашли в файлах, пробуем системные переменные (для Streamlit Cloud)
-if not api_key or len(api_key) <= 10:
-    load_dotenv()  # Загружает из .env по умолчанию
-    api_key = os.getenv('GEMINI_API_KEY')
 
-# Инициализация Gemini
-if api_key:
-    genai.configure(api_key=api_key)
-else:
-    genai.configure(api_key=None)
+def _get_genai():
+    """
+    Импортирует и настраивает SDK Gemini при первом обращении.
+    
+    Returns:
+        module: Модуль google.generativeai.
+    """
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=get_api_key())
+        _genai = genai
+    return _genai
+
+
+def _load_model_name():
+    """Возвращает сохраненное имя модели или None."""
+    try:
+        with open(GEMINI_MODEL_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except IOError:
+        return None
+
+
+def _remember_model(model_instance):
+    """Сохраняет имя найденной модели в файл и возвращает саму модель."""
+    try:
+        with open(GEMINI_MODEL_FILE, 'w', encoding='utf-8') as f:
+            f.write(model_instance.model_name)
+    except IOError:
+        pass
+    return model_instance
 
 
 def get_gemini_model():
     """
     Автоматически находит доступную модель Gemini для генерации контента.
     
+    Имя найденной модели сохраняется в файл, и при следующих запусках
+    поиск через list_models() не выполняется.
+    
     Returns:
         GenerativeModel: Инициализированная модель или None, если не найдена.
     """
-    if not api_key:
+    if not get_api_key():
         return None
     
+    genai = _get_genai()
+    
+    model_name = _load_model_name()
+    if model_name:
+        return genai.GenerativeModel(model_name)
+    
     # Приоритетный список моделей - Gemini 2.5 Pro (основная) и 2.5 Flash (запасная)
     preferred_models = [
         'gemini-2.5-pro',      # Основная модель - самая мощная
@@ -56,57 +115,27 @@ def get_gemini_model():
     
     # Сначала пробуем получить список доступных моделей через API
     try:
-        available_models = genai.list_models()
+        # Имена моделей, поддерживающих generateContent (без префикса 'models/'), в порядке API
+        supported_models = [
+            model.name.split('/', 1)[-1]
+            for model in genai.list_models()
+            if 'generateContent' in (getattr(model, 'supported_generation_methods', None) or ())
+        ]
+        supported_set = set(supported_models)
         
-        # Фильтруем модели, которые поддерживают generateContent
-        supported_models = []
-        for model in available_models:
-            # Проверяем, что модель поддерживает generateContent
-            if hasattr(model, 'supported_generation_methods') and model.supported_generation_methods:
-                if 'generateContent' in model.supported_generation_methods:
-                    # Извлекаем имя модели (убираем префикс 'models/')
-                    model_name = model.name
-                    if model_name.startswith('models/'):
-                        model_name = model_name.replace('models/', '')
-                    supported_models.append(model_name)
-        
-        # Ищем модели из приоритетного списка (2.5 Pro и 2.5 Flash)
+        # Ищем модель из приоритетного списка: точное совпадение, затем версия
+        # этой же модели (например, gemini-2.5-pro-preview-05-06)
         for preferred in preferred_models:
+            if preferred in supported_set:
+                return _remember_model(genai.GenerativeModel(preferred))
             for supported in supported_models:
-                # Проверяем точное совпадение или частичное (например, "gemini-2.5-pro" в "models/gemini-2.5-pro")
-                if preferred == supported or supported.endswith(preferred) or preferred in supported:
-                    try:
-                        return genai.GenerativeModel(preferred)
-                    except Exception:
-                        # Если не получилось с коротким именем, пробуем полное
-                        try:
-                            return genai.GenerativeModel(supported)
-                        except Exception:
-                            continue
-        
-        # Ищем модель из приоритетного списка
-        for preferred in preferred_models:
-            # Проверяем точное совпадение или частичное
-            for supported in supported_models:
-                if preferred == supported or supported.endswith(preferred):
-                    try:
-                        model_instance = genai.GenerativeModel(preferred)
-                        return model_instance
-                    except Exception as e:
-                        # Если не получилось, пробуем с полным именем
-                        try:
-                            return genai.GenerativeModel(supported)
-                        except Exception:
-                            continue
+                if supported.startswith(preferred + '-'):
+                    return _remember_model(genai.GenerativeModel(supported))
         
         # Если не нашли приоритетную, берем первую доступную
         if supported_models:
-            for model_name in supported_models:
-                try:
-                    return genai.GenerativeModel(model_name)
-                except Exception:
-                    continue
-    except Exception as e:
+            return _remember_model(genai.GenerativeModel(supported_models[0]))
+    except Exception:
         # Если не удалось получить список моделей, пробуем стандартные имена
         pass
     
@@ -138,35 +167,455 @@ def get_model():
     return _model_instance
 
 
+async def _aget_model():
+    """
+    Асинхронный вариант get_model: поиск модели (list_models, файл с именем)
+    выполняется в отдельном потоке и не блокирует фоновый event loop.
+    """
+    if _model_instance is not None:
+        return _model_instance
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, get_model)
+
+
+def _forget_model_if_unavailable(error, send_model=None):
+    """
+    Сбрасывает найденную модель, если запрос к ней завершился ошибкой NotFound
+    или PermissionDenied (модель выведена из эксплуатации или недоступна для ключа).
+    
+    Сохраненное имя модели удаляется, и при следующем запросе поиск модели
+    выполняется заново. Если запрос шел к модели поверх кэша контекста,
+    удаляется и эта запись кэша.
+    
+    Args:
+        error (Exception): Ошибка запроса.
+        send_model (GenerativeModel): Модель, к которой был отправлен запрос.
+    """
+    global _model_instance
+    from google.api_core import exceptions
+    if not isinstance(error, (exceptions.NotFound, exceptions.PermissionDenied)):
+        return
+    if send_model is not None:
+        _forget_context_model(send_model)
+    _model_instance = None
+    try:
+        os.remove(GEMINI_MODEL_FILE)
+    except OSError:
+        pass
+
+
+# Сообщения об ошибках генерации (текст GenerationError)
+NO_API_KEY_MESSAGE = "Ошибка: API ключ не установлен. Проверьте файлы .env, .env.local или env.local"
+NO_MODEL_MESSAGE = "Ошибка: Модель не инициализирована. Проверьте API ключ и доступность моделей Gemini."
+
+
+class GenerationError(RuntimeError):
+    """Генерация не удалась (при потоковой генерации - возможно, после части текста)."""
+
+
+class APIKeyError(GenerationError):
+    """API ключ Gemini не установлен."""
+
+
 def check_api_key():
-    """Проверяет, установлен ли API ключ."""
+    """Проверяет, установлен ли API ключ (сам ключ ищется один раз, см. get_api_key)."""
+    api_key = get_api_key()
     return api_key is not None and api_key != "your_api_key_here"
 
 
-def generate_ideas(brand_profile, count=5):
+def assert_api_key():
+    """
+    Проверяет API ключ.
+    
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+    """
+    if not check_api_key():
+        raise APIKeyError(NO_API_KEY_MESSAGE)
+
+
+# Кэш ответов модели: одинаковый промпт не отправляется в API повторно.
+# Семантический кэш: близкие по смыслу темы получают сохраненный ответ.
+# Оба создаются при первом обращении, а не при импорте модуля
+EMBEDDING_MODEL = "models/text-embedding-004"
+_llm_cache = None
+_semantic_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_llm_cache():
+    """Открывает кэш ответов модели при первом обращении."""
+    global _llm_cache
+    if _llm_cache is None:
+        with _cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMCache()
+    return _llm_cache
+
+
+def _get_semantic_cache():
+    """Загружает семантический кэш при первом обращении."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+
+def get_cache_stats():
+    """Возвращает статистику кэша ответов (hits, misses)."""
+    return dict(_get_llm_cache().stats)
+
+
+# Фоновый event loop для синхронных оберток. Асинхронный клиент Gemini
+# привязывается к циклу, в котором создан, поэтому цикл живет весь процесс.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _submit(coro):
+    """Запускает корутину в фоновом event loop, не дожидаясь результата."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop)
+
+
+def _run(coro):
+    """Выполняет корутину в фоновом event loop и возвращает ее результат."""
+    return _submit(coro).result()
+
+
+async def _embed_text(text):
+    """Возвращает эмбеддинг текста или None, если получить его не удалось."""
+    try:
+        result = await _get_genai().embed_content_async(model=EMBEDDING_MODEL, content=text)
+        return result["embedding"]
+    except Exception:
+        return None
+
+
+def _semantic_lookup(partition, embedding):
+    """
+    Ищет ответ в семантическом кэше.
+    
+    Найденный ответ не копируется в точный кэш: он получен для другого,
+    хотя и похожего запроса.
+    """
+    if embedding is None:
+        return None
+    try:
+        return _get_semantic_cache().get(partition, embedding)
+    except Exception:
+        # Сбой кэша не должен мешать генерации: считаем это промахом
+        return None
+
+
+def _store_response(key, text, partition=None, embedding=None):
+    """
+    Сохраняет ответ в кэши.
+    
+    Вызывается после успешного ответа API, поэтому сбой семантического кэша
+    не превращает готовый результат в ошибку генерации.
+    """
+    _get_llm_cache().set(key, text)
+    if embedding is not None:
+        try:
+            _get_semantic_cache().add(partition, embedding, text)
+        except Exception:
+            pass
+
+
+def _post_semantic(model, brand_context, topic, platform, length):
+    """
+    Параметры семантического кэша для поста.
+    
+    Похожими считаются только темы постов с одинаковыми моделью, контекстом
+    бренда, платформой и длиной: общий текст промпта в эмбеддинг не входит.
+    
+    Returns:
+        tuple: (раздел кэша, тема поста).
+    """
+    partition = cache_key(model.model_name, json.dumps([brand_context, platform, length], ensure_ascii=False))
+    return partition, topic
+
+
+# Контекст бренда, закэшированный на стороне Gemini (context caching):
+# при повторных запросах модель получает только текст задания.
+# Gemini кэширует контекст не короче минимального числа токенов, которое
+# зависит от модели, поэтому короткие профили отправляются в промпте целиком.
+CONTEXT_CACHE_TTL = timedelta(hours=1)
+_CONTEXT_CACHE_MIN_TOKENS = (
+    ('gemini-2.5-flash', 1024),
+    ('gemini-2.5-pro', 4096),
+    ('gemini-2.0-flash', 4096),
+    ('gemini-1.5-', 32768),
+)
+_CONTEXT_CACHE_MAXSIZE = 32
+_CACHED_CONTEXT_REF = "(см. информацию о бренде в начале контекста)"
+# Записи (срок действия, модель или None) по ключу модель + контекст.
+# _context_lock защищает только словари; обращения к API выполняются под
+# блокировкой своего ключа, чтобы не создавать один и тот же платный кэш дважды
+_context_models = {}
+_context_key_locks = {}
+_context_lock = threading.Lock()
+
+
+def _context_cache_min_tokens(model):
+    """Минимальный размер кэша контекста для модели или None, если модель его не поддерживает."""
+    model_name = model.model_name.split('/', 1)[-1]
+    for prefix, min_tokens in _CONTEXT_CACHE_MIN_TOKENS:
+        if model_name.startswith(prefix):
+            return min_tokens
+    return None
+
+
+def _context_cache_candidate(model, brand_context):
+    """
+    Быстрая проверка без обращения к API: в токене не меньше одного символа,
+    поэтому более короткий контекст заведомо не достигает минимума модели.
     """
-    Генерирует идеи для контента на основе профиля бренда.
+    min_tokens = _context_cache_min_tokens(model)
+    return min_tokens is not None and bool(brand_context) and len(brand_context) >= min_tokens
+
+
+def _create_context_model(model, brand_context):
+    """Создает кэш контекста в Gemini и модель поверх него; None, если контекст слишком короткий."""
+    if model.count_tokens(brand_context).total_tokens < _context_cache_min_tokens(model):
+        return None
+    genai = _get_genai()
+    from google.generativeai import caching
+    cached_content = caching.CachedContent.create(
+        model=model.model_name,
+        contents=[brand_context],
+        ttl=CONTEXT_CACHE_TTL,
+    )
+    return genai.GenerativeModel.from_cached_content(cached_content)
+
+
+def _with_cached_context(model, prompt, brand_context):
+    """
+    Заменяет контекст бренда в промпте ссылкой на закэшированный в Gemini контекст.
+    
+    Может обращаться к API (подсчет токенов, создание кэша), поэтому из
+    фонового event loop вызывается в отдельном потоке.
     
     Args:
-        brand_profile (dict): Профиль бренда.
-        count (int): Количество идей для генерации (по умолчанию 5).
+        model (GenerativeModel): Модель Gemini.
+        prompt (str): Полный текст промпта.
+        brand_context (str): Контекст бренда, входящий в промпт.
         
     Returns:
-        list: Список идей или сообщение об ошибке.
+        tuple: (модель, промпт) для отправки в API. Если кэш контекста
+        недоступен, возвращаются исходные модель и промпт.
     """
-    if not check_api_key():
-        return ["Ошибка: API ключ не установлен. Проверьте файлы .env, .env.local или env.local"]
+    if not _context_cache_candidate(model, brand_context):
+        return model, prompt
     
-    model = get_model()
-    if not model:
-        return ["Ошибка: Модель не инициализирована. Проверьте API ключ и доступность моделей Gemini."]
+    key = cache_key(model.model_name, brand_context)
+    with _context_lock:
+        entry = _context_models.get(key)
+        key_lock = _context_key_locks.setdefault(key, threading.Lock())
     
-    brand_context = get_brand_context_string(brand_profile)
+    if entry is None or entry[0] <= time.time():
+        with key_lock:
+            # Пока ждали блокировку, кэш мог создать другой поток
+            with _context_lock:
+                entry = _context_models.get(key)
+            now = time.time()
+            if entry is None or entry[0] <= now:
+                try:
+                    context_model = _create_context_model(model, brand_context)
+                except Exception:
+                    # Кэш контекста недоступен: не пытаемся снова до истечения TTL
+                    context_model = None
+                # Обновляем кэш немного раньше, чем он истечет на стороне Gemini
+                entry = (now + CONTEXT_CACHE_TTL.total_seconds() - 60, context_model)
+                _remember_context_model(key, entry, now)
     
-    prompt = f"""Ты - эксперт по контент-маркетингу. На основе следующей информации о бренде, придумай {count} креативных идей для контента (посты, статьи, видео и т.д.).
+    if entry[1] is None:
+        return model, prompt
+    return entry[1], prompt.replace(brand_context, _CACHED_CONTEXT_REF, 1)
+
+
+def _remember_context_model(key, entry, now):
+    """Сохраняет запись кэша контекста, вытесняя устаревшие и самые старые записи."""
+    with _context_lock:
+        for stale in [k for k, (expires, _) in _context_models.items() if expires <= now]:
+            del _context_models[stale]
+        while len(_context_models) >= _CONTEXT_CACHE_MAXSIZE:
+            del _context_models[min(_context_models, key=lambda k: _context_models[k][0])]
+        _context_models[key] = entry
+        for unused in [k for k, lock in _context_key_locks.items()
+                       if k not in _context_models and not lock.locked()]:
+            del _context_key_locks[unused]
+
+
+def _forget_context_model(context_model):
+    """Удаляет запись кэша контекста, модель которой больше недоступна."""
+    with _context_lock:
+        for key in [k for k, (_, m) in _context_models.items() if m is context_model]:
+            del _context_models[key]
+
+
+async def _awith_cached_context(model, prompt, brand_context):
+    """Асинхронный вариант _with_cached_context: обращения к API не блокируют event loop."""
+    if not _context_cache_candidate(model, brand_context):
+        return model, prompt
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _with_cached_context, model, prompt, brand_context)
+
+
+# Выполняющиеся запросы по ключу кэша (используются только в фоновом event loop):
+# одинаковый запрос, например клик во время предзагрузки идей, дожидается
+# уже отправленного вместо второго платного обращения к API
+_inflight = {}
+
+
+async def _agenerate_text(model, prompt, semantic=None, generation_config=None, brand_context=None):
+    """
+    Генерирует ответ модели с учетом кэша.
+    
+    Если такой же запрос уже выполняется, дожидается его результата.
+    
+    Args:
+        model (GenerativeModel): Модель Gemini.
+        prompt (str): Текст промпта.
+        semantic (tuple): (раздел, текст) для семантического кэша: ответ ищется
+            среди похожих текстов того же раздела. None - только точный кэш.
+        generation_config (dict): Параметры генерации (например, схема ответа).
+        brand_context (str): Контекст бренда в промпте, который можно закэшировать в Gemini.
+        
+    Returns:
+        str: Текст ответа без пробелов по краям.
+    """
+    key = cache_key(model.model_name, prompt)
+    cached = _get_llm_cache().get(key)
+    if cached is not None:
+        return cached
+    
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        text = await _agenerate_uncached(model, key, prompt, semantic, generation_config, brand_context)
+    except Exception as e:
+        future.set_exception(e)
+        # Ошибку получат ожидающие; если их нет, она не логируется как необработанная
+        future.exception()
+        raise
+    else:
+        future.set_result(text)
+        return text
+    finally:
+        if not future.done():
+            future.cancel()
+        del _inflight[key]
+
+
+async def _agenerate_uncached(model, key, prompt, semantic, generation_config, brand_context):
+    """Генерирует ответ при промахе точного кэша (см. _agenerate_text)."""
+    partition, semantic_text = semantic or (None, None)
+    embedding = await _embed_text(semantic_text) if semantic else None
+    cached = _semantic_lookup(partition, embedding)
+    if cached is not None:
+        return cached
+    
+    send_model, send_prompt = await _awith_cached_context(model, prompt, brand_context)
+    try:
+        response = await send_model.generate_content_async(send_prompt, generation_config=generation_config)
+    except Exception as e:
+        _forget_model_if_unavailable(e, send_model)
+        raise
+    text = response.text.strip()
+    _store_response(key, text, partition, embedding)
+    return text
+
+
+def _stream_text(model, prompt, semantic=None, brand_context=None):
+    """
+    Генерирует ответ модели потоково с учетом кэша.
+    
+    При попадании в кэш ответ возвращается одним фрагментом.
+    
+    Args:
+        model (GenerativeModel): Модель Gemini.
+        prompt (str): Текст промпта.
+        semantic (tuple): (раздел, текст) для семантического кэша: ответ ищется
+            среди похожих текстов того же раздела. None - только точный кэш.
+        brand_context (str): Контекст бренда в промпте, который можно закэшировать в Gemini.
+        
+    Yields:
+        str: Очередной фрагмент ответа.
+    """
+    key = cache_key(model.model_name, prompt)
+    cached = _get_llm_cache().get(key)
+    if cached is not None:
+        yield cached
+        return
+    
+    partition, semantic_text = semantic or (None, None)
+    embedding = _run(_embed_text(semantic_text)) if semantic else None
+    cached = _semantic_lookup(partition, embedding)
+    if cached is not None:
+        yield cached
+        return
+    
+    send_model, send_prompt = _with_cached_context(model, prompt, brand_context)
+    chunks = []
+    try:
+        for chunk in send_model.generate_content(send_prompt, stream=True):
+            chunks.append(chunk.text)
+            yield chunk.text
+    except Exception as e:
+        _forget_model_if_unavailable(e, send_model)
+        raise
+    _store_response(key, "".join(chunks).strip(), partition, embedding)
+
+
+# Строка списка идей: "1. идея", "1) идея" или "- идея". Пробелы ищутся только
+# внутри строки, а после номера обязателен пробел, чтобы не захватывать
+# следующую строку и дробные числа вроде "1.5 кг"
+_IDEA_RE = re.compile(r'^[ \t]*(?:\d+[.)][ \t]+|-[ \t]*)(.+?)[ \t]*$', re.M)
+
+# Требования к длине поста
+_LENGTH_REQUIREMENTS = {
+    "short": "короткий пост (2-3 предложения, до 150 слов)",
+    "medium": "средний пост (4-6 предложений, 150-300 слов)",
+    "long": "длинный пост (7+ предложений, 300+ слов)"
+}
+
+# Особенности платформ
+_PLATFORM_NOTES = {
+    "instagram": "Используй эмодзи, хештеги в конце, короткие абзацы. Стиль должен быть визуальным и вовлекающим.",
+    "facebook": "Более развернутый формат, можно использовать списки. Подходит для более детального контента.",
+    "telegram": "Неформальный стиль, можно использовать эмодзи. Хорошо подходят короткие абзацы.",
+    "blog": "Развернутый формат, структурированный текст с подзаголовками, списками. Более формальный стиль."
+}
+
+# Схема ответа для пакетной генерации постов: JSON массив строк
+_POSTS_BATCH_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {"type": "array", "items": {"type": "string"}},
+}
+
+# Названия периодов для контент-плана
+_PERIOD_NAMES = {
+    "week": "неделю",
+    "month": "месяц"
+}
+
+# Шаблоны промптов: при вызове подставляются только данные
+_IDEAS_TMPL = string.Template("""Ты - эксперт по контент-маркетингу. На основе следующей информации о бренде, придумай $count креативных идей для контента (посты, статьи, видео и т.д.).
 
 Информация о бренде:
-{brand_context}
+$brand_context
 
 Требования:
 - Идеи должны быть релевантны целевой аудитории
@@ -174,28 +623,126 @@ def generate_ideas(brand_profile, count=5):
 - Идеи должны быть практичными и реализуемыми
 - Разнообразь форматы (текст, видео, инфографика и т.д.)
 
-Верни список из {count} идей. Каждая идея должна быть на отдельной строке и начинаться с номера (1., 2., 3. и т.д.).
-Будь конкретным и креативным."""
+Верни список из $count идей. Каждая идея должна быть на отдельной строке и начинаться с номера (1., 2., 3. и т.д.).
+Будь конкретным и креативным.""")
 
-    try:
-        response = model.generate_content(prompt)
-        ideas_text = response.text.strip()
-        
-        # Разбиваем на отдельные идеи
-        ideas = [idea.strip() for idea in ideas_text.split('\n') if idea.strip() and (idea.strip()[0].isdigit() or idea.strip().startswith('-'))]
+_POST_TMPL = string.Template("""Ты - профессиональный копирайтер. Напиши пост для $platform на тему "$topic".
+
+Информация о бренде:
+$brand_context
+
+Требования к посту:
+- Длина: $length_requirement
+- Платформа: $platform
+- $platform_note
+- Соблюдай тональность бренда
+- Обращайся к целевой аудитории
+- Включи призыв к действию (CTA)
+- Пост должен быть интересным и полезным
+
+Напиши готовый пост, который можно сразу публиковать.""")
+
+_PLAN_TMPL = string.Template("""Ты - эксперт по контент-планированию. Создай детальный контент-план на $period_name ($count постов) для бренда.
+
+Информация о бренде:
+$brand_context
+
+Требования:
+- Создай план на $count дней
+- Для каждого дня укажи: дату/день недели, тему поста, формат (текст/видео/инфографика), краткое описание
+- Темы должны быть разнообразными и релевантными
+- Учитывай целевую аудиторию и ценности бренда
+- Распредели контент равномерно по дням
+
+Верни структурированный план в формате:
+День 1 (Понедельник):
+Тема: [тема]
+Формат: [формат]
+Описание: [краткое описание]
+
+И так далее для всех дней.""")
+
+_POSTS_BATCH_JOB_TMPL = string.Template("""Пост $number: для $platform на тему "$topic".
+- Длина: $length_requirement
+- $platform_note""")
+
+_POSTS_BATCH_TMPL = string.Template("""Ты - профессиональный копирайтер. Напиши $count постов для бренда.
+
+Информация о бренде:
+$brand_context
+
+Общие требования ко всем постам:
+- Соблюдай тональность бренда
+- Обращайся к целевой аудитории
+- Включи призыв к действию (CTA)
+- Пост должен быть интересным и полезным
+- Посты для одинаковых заданий должны заметно отличаться друг от друга
+
+Задания:
+$jobs
+
+Верни JSON массив длины $count, где элемент i - готовый текст поста для задания i.""")
+
+
+def _post_prompt(brand_context, topic, platform, length):
+    """Строит промпт для генерации поста."""
+    return _POST_TMPL.substitute(
+        brand_context=brand_context,
+        topic=topic,
+        platform=platform,
+        length_requirement=_LENGTH_REQUIREMENTS.get(length, _LENGTH_REQUIREMENTS['medium']),
+        platform_note=_PLATFORM_NOTES.get(platform, ''),
+    )
+
+
+def _content_plan_prompt(brand_context, period, count):
+    """Строит промпт для генерации контент-плана."""
+    return _PLAN_TMPL.substitute(
+        brand_context=brand_context,
+        period_name=_PERIOD_NAMES.get(period, "месяц"),
+        count=count,
+    )
+
+
+async def agenerate_ideas(brand_profile, count=5):
+    """
+    Асинхронно генерирует идеи для контента на основе профиля бренда.
+    
+    Args:
+        brand_profile (dict): Профиль бренда.
+        count (int): Количество идей для генерации (по умолчанию 5).
         
-        # Если не получилось разбить, возвращаем весь текст
-        if not ideas:
-            ideas = [ideas_text]
+    Returns:
+        list: Список идей.
         
-        return ideas[:count] if len(ideas) > count else ideas
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+        GenerationError: Если генерация не удалась.
+    """
+    assert_api_key()
+    
+    model = await _aget_model()
+    if not model:
+        raise GenerationError(NO_MODEL_MESSAGE)
+    
+    brand_context = get_brand_context_string(brand_profile)
+    
+    prompt = _IDEAS_TMPL.substitute(count=count, brand_context=brand_context)
+
+    try:
+        ideas_text = await _agenerate_text(model, prompt, brand_context=brand_context)
     except Exception as e:
-        return [f"Ошибка при генерации идей: {str(e)}"]
+        raise GenerationError(f"Ошибка при генерации идей: {str(e)}") from e
+    
+    # Разбиваем на отдельные идеи; если не получилось, возвращаем весь текст
+    ideas = _IDEA_RE.findall(ideas_text) or [ideas_text]
+    
+    return ideas[:count]
 
 
-def generate_post(brand_profile, topic, platform="instagram", length="short"):
+async def agenerate_post(brand_profile, topic, platform="instagram", length="short"):
     """
-    Генерирует готовый пост на основе темы и профиля бренда.
+    Асинхронно генерирует готовый пост на основе темы и профиля бренда.
     
     Args:
         brand_profile (dict): Профиль бренда.
@@ -204,100 +751,237 @@ def generate_post(brand_profile, topic, platform="instagram", length="short"):
         length (str): Длина поста (short, medium, long).
         
     Returns:
-        str: Сгенерированный текст поста или сообщение об ошибке.
+        str: Сгенерированный текст поста.
+        
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+        GenerationError: Если генерация не удалась.
     """
-    if not check_api_key():
-        return "Ошибка: API ключ не установлен. Проверьте файлы .env, .env.local или env.local"
+    assert_api_key()
     
-    model = get_model()
+    model = await _aget_model()
     if not model:
-        return "Ошибка: Модель не инициализирована. Проверьте API ключ и доступность моделей Gemini."
+        raise GenerationError(NO_MODEL_MESSAGE)
     
     brand_context = get_brand_context_string(brand_profile)
     
-    # Определяем требования к длине
-    length_requirements = {
-        "short": "короткий пост (2-3 предложения, до 150 слов)",
-        "medium": "средний пост (4-6 предложений, 150-300 слов)",
-        "long": "длинный пост (7+ предложений, 300+ слов)"
-    }
+    prompt = _post_prompt(brand_context, topic, platform, length)
+
+    try:
+        return await _agenerate_text(
+            model,
+            prompt,
+            semantic=_post_semantic(model, brand_context, topic, platform, length),
+            brand_context=brand_context,
+        )
+    except Exception as e:
+        raise GenerationError(f"Ошибка при генерации поста: {str(e)}") from e
+
+
+async def agenerate_content_plan(brand_profile, period="week", count=7):
+    """
+    Асинхронно генерирует контент-план на указанный период.
+    
+    Args:
+        brand_profile (dict): Профиль бренда.
+        period (str): Период планирования (week, month).
+        count (int): Количество дней/постов в плане.
+        
+    Returns:
+        str: Сгенерированный контент-план.
+        
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+        GenerationError: Если генерация не удалась.
+    """
+    assert_api_key()
+    
+    model = await _aget_model()
+    if not model:
+        raise GenerationError(NO_MODEL_MESSAGE)
     
-    # Определяем особенности платформы
-    platform_notes = {
-        "instagram": "Используй эмодзи, хештеги в конце, короткие абзацы. Стиль должен быть визуальным и вовлекающим.",
-        "facebook": "Более развернутый формат, можно использовать списки. Подходит для более детального контента.",
-        "telegram": "Неформальный стиль, можно использовать эмодзи. Хорошо подходят короткие абзацы.",
-        "blog": "Развернутый формат, структурированный текст с подзаголовками, списками. Более формальный стиль."
-    }
+    brand_context = get_brand_context_string(brand_profile)
     
-    prompt = f"""Ты - профессиональный копирайтер. Напиши пост для {platform} на тему "{topic}".
+    prompt = _content_plan_prompt(brand_context, period, count)
 
-Информация о бренде:
-{brand_context}
+    try:
+        return await _agenerate_text(model, prompt, brand_context=brand_context)
+    except Exception as e:
+        raise GenerationError(f"Ошибка при генерации контент-плана: {str(e)}") from e
 
-Требования к посту:
-- Длина: {length_requirements.get(length, length_requirements['medium'])}
-- Платформа: {platform}
-- {platform_notes.get(platform, '')}
-- Соблюдай тональность бренда
-- Обращайся к целевой аудитории
-- Включи призыв к действию (CTA)
-- Пост должен быть интересным и полезным
 
-Напиши готовый пост, который можно сразу публиковать."""
+async def agenerate_posts_batch(brand_profile, jobs):
+    """
+    Асинхронно генерирует несколько постов одним запросом к модели.
+    
+    Контекст бренда передается в промпт один раз для всех постов.
+    
+    Args:
+        brand_profile (dict): Профиль бренда.
+        jobs (list): Список словарей с ключами topic (обязательно), platform, length.
+        
+    Returns:
+        list: Тексты постов в порядке jobs.
+        
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+        GenerationError: Если задания некорректны или генерация не удалась.
+    """
+    if not jobs:
+        return []
+    
+    assert_api_key()
+    
+    model = await _aget_model()
+    if not model:
+        raise GenerationError(NO_MODEL_MESSAGE)
+    
+    brand_context = get_brand_context_string(brand_profile)
 
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        for i, job in enumerate(jobs, 1):
+            if not job.get('topic'):
+                raise ValueError(f"в задании {i} не указана тема")
+        
+        jobs_text = "\n\n".join(
+            _POSTS_BATCH_JOB_TMPL.substitute(
+                number=i,
+                topic=job['topic'],
+                platform=job.get('platform', 'instagram'),
+                length_requirement=_LENGTH_REQUIREMENTS.get(job.get('length', 'short'), _LENGTH_REQUIREMENTS['medium']),
+                platform_note=_PLATFORM_NOTES.get(job.get('platform', 'instagram'), ''),
+            )
+            for i, job in enumerate(jobs, 1)
+        )
+        prompt = _POSTS_BATCH_TMPL.substitute(brand_context=brand_context, count=len(jobs), jobs=jobs_text)
+        
+        posts = json.loads(await _agenerate_text(
+            model, prompt, generation_config=_POSTS_BATCH_CONFIG, brand_context=brand_context
+        ))
+        if not isinstance(posts, list) or len(posts) != len(jobs):
+            raise ValueError(f"ожидалось {len(jobs)} постов, получено {len(posts) if isinstance(posts, list) else 0}")
+        return [str(post).strip() for post in posts]
+    except Exception as e:
+        raise GenerationError(f"Ошибка при генерации постов: {str(e)}") from e
+
+
+def generate_ideas(brand_profile, count=5):
+    """Синхронная обертка над agenerate_ideas."""
+    return _run(agenerate_ideas(brand_profile, count))
+
+
+def prefetch_ideas(brand_profile, count=5):
+    """
+    Заранее генерирует идеи в фоне, чтобы следующий такой же запрос
+    был обслужен из кэша.
+    
+    Args:
+        brand_profile (dict): Профиль бренда.
+        count (int): Количество идей.
+        
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+    """
+    assert_api_key()
+    _submit(agenerate_ideas(brand_profile, count))
+
+
+def generate_post(brand_profile, topic, platform="instagram", length="short"):
+    """
+    Потоково генерирует готовый пост на основе темы и профиля бренда.
+    
+    Args:
+        brand_profile (dict): Профиль бренда.
+        topic (str): Тема поста.
+        platform (str): Платформа для поста (instagram, facebook, telegram, blog).
+        length (str): Длина поста (short, medium, long).
+        
+    Yields:
+        str: Очередной фрагмент текста поста.
+        
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+        GenerationError: Если генерация не удалась; уже выданный текст неполон.
+    """
+    assert_api_key()
+    
+    model = get_model()
+    if not model:
+        raise GenerationError(NO_MODEL_MESSAGE)
+    
+    brand_context = get_brand_context_string(brand_profile)
+    prompt = _post_prompt(brand_context, topic, platform, length)
+    
+    try:
+        yield from _stream_text(
+            model,
+            prompt,
+            semantic=_post_semantic(model, brand_context, topic, platform, length),
+            brand_context=brand_context,
+        )
     except Exception as e:
-        return f"Ошибка при генерации поста: {str(e)}"
+        raise GenerationError(f"Ошибка при генерации поста: {str(e)}") from e
 
 
 def generate_content_plan(brand_profile, period="week", count=7):
     """
-    Генерирует контент-план на указанный период.
+    Потоково генерирует контент-план на указанный период.
     
     Args:
         brand_profile (dict): Профиль бренда.
         period (str): Период планирования (week, month).
         count (int): Количество дней/постов в плане.
         
-    Returns:
-        str: Сгенерированный контент-план или сообщение об ошибке.
+    Yields:
+        str: Очередной фрагмент контент-плана.
+        
+    Raises:
+        APIKeyError: Если API ключ не установлен.
+        GenerationError: Если генерация не удалась; уже выданный текст неполон.
     """
-    if not check_api_key():
-        return "Ошибка: API ключ не установлен. Проверьте файлы .env, .env.local или env.local"
+    assert_api_key()
     
     model = get_model()
     if not model:
-        return "Ошибка: Модель не инициализирована. Проверьте API ключ и доступность моделей Gemini."
+        raise GenerationError(NO_MODEL_MESSAGE)
     
     brand_context = get_brand_context_string(brand_profile)
+    prompt = _content_plan_prompt(brand_context, period, count)
     
-    period_name = "неделю" if period == "week" else "месяц"
-    
-    prompt = f"""Ты - эксперт по контент-планированию. Создай детальный контент-план на {period_name} ({count} постов) для бренда.
+    try:
+        yield from _stream_text(model, prompt, brand_context=brand_context)
+    except Exception as e:
+        raise GenerationError(f"Ошибка при генерации контент-плана: {str(e)}") from e
 
-Информация о бренде:
-{brand_context}
 
-Требования:
-- Создай план на {count} дней
-- Для каждого дня укажи: дату/день недели, тему поста, формат (текст/видео/инфографика), краткое описание
-- Темы должны быть разнообразными и релевантными
-- Учитывай целевую аудиторию и ценности бренда
-- Распредели контент равномерно по дням
-
-Верни структурированный план в формате:
-День 1 (Понедельник):
-Тема: [тема]
-Формат: [формат]
-Описание: [краткое описание]
+def generate_posts_batch(brand_profile, jobs):
+    """Синхронная обертка над agenerate_posts_batch."""
+    return _run(agenerate_posts_batch(brand_profile, jobs))
 
-И так далее для всех дней."""
 
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"Ошибка при генерации контент-плана: {str(e)}"
+def generate_all(brand_profile, topic, platform="instagram", length="short", idea_count=5, period="week", post_count=7):
+    """
+    Параллельно генерирует идеи, пост и контент-план.
+    
+    Args:
+        brand_profile (dict): Профиль бренда.
+        topic (str): Тема поста.
+        platform (str): Платформа для поста.
+        length (str): Длина поста.
+        idea_count (int): Количество идей.
+        period (str): Период контент-плана.
+        post_count (int): Количество постов в контент-плане.
+        
+    Returns:
+        tuple: (список идей, текст поста, контент-план). Ошибка одной части
+        не отменяет остальные: на ее месте возвращается GenerationError.
+    """
+    async def gather_all():
+        return await asyncio.gather(
+            agenerate_ideas(brand_profile, idea_count),
+            agenerate_post(brand_profile, topic, platform, length),
+            agenerate_content_plan(brand_profile, period, post_count),
+            return_exceptions=True,
+        )
+    
+    return tuple(_run(gather_all()))
@@ -4,7 +4,10 @@ BrandOS - Приложение для генерации контента на 
 """
 import streamlit as st
 from brand_data import load_brand_profile, save_brand_profile, get_brand_context_string
-from ai_engine import generate_ideas, generate_post, generate_content_plan, check_api_key
+from ai_engine import generate_ideas, generate_post, generate_content_plan, generate_all, generate_posts_batch, prefetch_ideas, check_api_key, get_cache_stats, GenerationError
+
+# Количество идей по умолчанию (для него идеи генерируются заранее)
+DEFAULT_IDEA_COUNT = 5
 
 # Настройка страницы
 st.set_page_config(
@@ -18,6 +21,35 @@ st.set_page_config(
 if 'brand_profile' not in st.session_state:
     st.session_state.brand_profile = load_brand_profile()
 
+# Версия профиля входит в ключи полей формы: при загрузке нового профиля
+# поля создаются заново с новыми значениями без перезапуска скрипта
+if 'profile_version' not in st.session_state:
+    st.session_state.profile_version = 0
+
+# Поля формы профиля бренда
+PROFILE_FIELDS = ('company_name', 'company_description', 'target_audience', 'tone_of_voice', 'brand_values', 'key_messages')
+
+
+def refresh_profile():
+    """Перечитывает профиль из файла и пересоздает поля формы."""
+    st.session_state.brand_profile = load_brand_profile()
+    st.session_state.profile_version += 1
+
+
+def save_profile():
+    """
+    Сохраняет профиль из полей формы.
+    
+    Вызывается как on_click до выполнения скрипта, поэтому боковая панель
+    и предзагрузка идей уже видят новый профиль.
+    """
+    version = st.session_state.profile_version
+    profile_data = {field: st.session_state[f"{field}_{version}"] for field in PROFILE_FIELDS}
+    st.session_state.profile_saved = save_brand_profile(profile_data)
+    if st.session_state.profile_saved:
+        st.session_state.brand_profile = profile_data
+
+
 # Заголовок приложения
 st.title("🚀 BrandOS")
 st.markdown("### Генератор контента на основе профиля вашего бренда")
@@ -37,6 +69,12 @@ if not check_api_key():
     """)
     st.stop()
 
+# Пока пользователь смотрит профиль, заранее генерируем идеи для вкладки "Брейншторм"
+if st.session_state.brand_profile and any(st.session_state.brand_profile.values()):
+    if st.session_state.get('prefetched') != st.session_state.brand_profile:
+        st.session_state.prefetched = st.session_state.brand_profile
+        prefetch_ideas(st.session_state.brand_profile, count=DEFAULT_IDEA_COUNT)
+
 # Боковая панель с информацией
 with st.sidebar:
     st.header("ℹ️ О приложении")
@@ -53,11 +91,13 @@ with st.sidebar:
     # Показываем текущий профиль
     if st.session_state.brand_profile:
         st.success("✅ Профиль бренда загружен")
-        if st.button("🔄 Обновить профиль"):
-            st.session_state.brand_profile = load_brand_profile()
-            st.rerun()
+        st.button("🔄 Обновить профиль", on_click=refresh_profile)
     else:
         st.warning("⚠️ Профиль бренда не заполнен")
+    
+    # Статистика кэша ответов AI
+    cache_stats = get_cache_stats()
+    st.caption(f"🗄️ Кэш AI: попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}")
 
 # Основные вкладки
 tab1, tab2, tab3, tab4 = st.tabs(["📋 Профиль бренда", "💡 Брейншторм", "✍️ Генератор постов", "📅 Контент-план"])
@@ -68,43 +108,49 @@ with tab1:
     st.markdown("Заполните информацию о вашей компании. Это поможет AI создавать релевантный контент.")
     
     # Поля для ввода данных
-    company_name = st.text_input(
+    st.text_input(
         "Название компании",
         value=st.session_state.brand_profile.get('company_name', ''),
+        key=f"company_name_{st.session_state.profile_version}",
         help="Официальное название вашей компании"
     )
     
-    company_description = st.text_area(
+    st.text_area(
         "Описание компании",
         value=st.session_state.brand_profile.get('company_description', ''),
+        key=f"company_description_{st.session_state.profile_version}",
         height=100,
         help="Чем занимается ваша компания? Что вы предлагаете?"
     )
     
-    target_audience = st.text_area(
+    st.text_area(
         "Целевая аудитория",
         value=st.session_state.brand_profile.get('target_audience', ''),
+        key=f"target_audience_{st.session_state.profile_version}",
         height=80,
         help="Опишите вашу целевую аудиторию: возраст, интересы, потребности"
     )
     
-    tone_of_voice = st.text_area(
+    st.text_area(
         "Тональность общения",
         value=st.session_state.brand_profile.get('tone_of_voice', ''),
+        key=f"tone_of_voice_{st.session_state.profile_version}",
         height=80,
         help="Как вы общаетесь с клиентами? (дружелюбно, профессионально, неформально и т.д.)"
     )
     
-    brand_values = st.text_area(
+    st.text_area(
         "Ценности бренда",
         value=st.session_state.brand_profile.get('brand_values', ''),
+        key=f"brand_values_{st.session_state.profile_version}",
         height=80,
         help="Какие ценности важны для вашего бренда?"
     )
     
-    key_messages = st.text_area(
+    st.text_area(
         "Ключевые сообщения",
         value=st.session_state.brand_profile.get('key_messages', ''),
+        key=f"key_messages_{st.session_state.profile_version}",
         height=80,
         help="Основные сообщения, которые вы хотите донести до аудитории"
     )
@@ -112,22 +158,14 @@ with tab1:
     col1, col2 = st.columns([1, 4])
     
     with col1:
-        if st.button("💾 Сохранить профиль", type="primary"):
-            profile_data = {
-                'company_name': company_name,
-                'company_description': company_description,
-                'target_audience': target_audience,
-                'tone_of_voice': tone_of_voice,
-                'brand_values': brand_values,
-                'key_messages': key_messages
-            }
-            
-            if save_brand_profile(profile_data):
-                st.session_state.brand_profile = profile_data
-                st.success("✅ Профиль успешно сохранен!")
-                st.rerun()
-            else:
-                st.error("❌ Ошибка при сохранении профиля")
+        st.button("💾 Сохранить профиль", type="primary", on_click=save_profile)
+        
+        # Результат сохранения из save_profile показывается один раз
+        profile_saved = st.session_state.pop('profile_saved', None)
+        if profile_saved:
+            st.success("✅ Профиль успешно сохранен!")
+        elif profile_saved is not None:
+            st.error("❌ Ошибка при сохранении профиля")
     
     # Показываем текущий контекст
     if st.session_state.brand_profile:
@@ -145,11 +183,15 @@ with tab2:
         col1, col2 = st.columns([1, 3])
         
         with col1:
-            idea_count = st.number_input("Количество идей", min_value=3, max_value=10, value=5)
+            idea_count = st.number_input("Количество идей", min_value=3, max_value=10, value=DEFAULT_IDEA_COUNT)
         
         if st.button("🎯 Придумать идеи", type="primary"):
             with st.spinner("🤔 Генерирую идеи..."):
-                ideas = generate_ideas(st.session_state.brand_profile, count=idea_count)
+                try:
+                    ideas = generate_ideas(st.session_state.brand_profile, count=idea_count)
+                except GenerationError as e:
+                    st.error(str(e))
+                    ideas = []
                 
                 if ideas:
                     st.success(f"✅ Сгенерировано {len(ideas)} идей!")
@@ -199,27 +241,71 @@ with tab3:
             if not topic:
                 st.error("⚠️ Введите тему поста")
             else:
-                with st.spinner("✍️ Пишу пост..."):
-                    post_text = generate_post(
+                # Текст выводится по мере генерации; при ошибке неполный текст заменяется сообщением
+                post_placeholder = st.empty()
+                try:
+                    with post_placeholder.container():
+                        post_text = st.write_stream(generate_post(
+                            st.session_state.brand_profile,
+                            topic,
+                            platform,
+                            length
+                        ))
+                except GenerationError as e:
+                    post_placeholder.error(str(e))
+                else:
+                    st.success("✅ Пост готов!")
+                    
+                    # Кнопка для копирования
+                    st.code(post_text, language=None)
+        
+        if st.button("🚀 Сгенерировать всё", help="Идеи, пост и контент-план на неделю одновременно"):
+            if not topic:
+                st.error("⚠️ Введите тему поста")
+            else:
+                with st.spinner("⚡ Генерирую идеи, пост и контент-план..."):
+                    ideas, post_text, plan = generate_all(
                         st.session_state.brand_profile,
                         topic,
                         platform,
                         length
                     )
-                    
-                    if post_text and not post_text.startswith("Ошибка"):
-                        st.success("✅ Пост готов!")
-                        st.text_area(
-                            "Ваш пост:",
-                            value=post_text,
-                            height=300,
-                            label_visibility="collapsed"
-                        )
-                        
-                        # Кнопка для копирования
-                        st.code(post_text, language=None)
-                    else:
-                        st.error(post_text)
+                
+                # Каждая часть генерируется независимо: вместо неудавшейся приходит GenerationError
+                st.subheader("💡 Идеи")
+                if isinstance(ideas, GenerationError):
+                    st.error(str(ideas))
+                else:
+                    for i, idea in enumerate(ideas, 1):
+                        st.markdown(f"**{i}.** {idea}")
+                
+                st.subheader("✍️ Пост")
+                if isinstance(post_text, GenerationError):
+                    st.error(str(post_text))
+                else:
+                    st.code(post_text, language=None)
+                
+                st.subheader("📅 Контент-план на неделю")
+                if isinstance(plan, GenerationError):
+                    st.error(str(plan))
+                else:
+                    st.code(plan, language=None)
+        
+        if st.button("🔀 Два варианта (A/B)", help="Два разных варианта поста одним запросом для сравнения"):
+            if not topic:
+                st.error("⚠️ Введите тему поста")
+            else:
+                try:
+                    with st.spinner("✍️ Пишу два варианта поста..."):
+                        job = {'topic': topic, 'platform': platform, 'length': length}
+                        variants = generate_posts_batch(st.session_state.brand_profile, [job, job])
+                except GenerationError as e:
+                    st.error(str(e))
+                else:
+                    for column, label, variant in zip(st.columns(2), ("A", "B"), variants):
+                        with column:
+                            st.subheader(f"Вариант {label}")
+                            st.code(variant, language=None)
 
 # Вкладка 4: Контент-план
 with tab4:
@@ -249,26 +335,22 @@ with tab4:
             )
         
         if st.button("📅 Создать контент-план", type="primary"):
-            with st.spinner("📋 Создаю контент-план..."):
-                plan = generate_content_plan(
-                    st.session_state.brand_profile,
-                    period,
-                    post_count
-                )
+            # План выводится по мере генерации; при ошибке неполный текст заменяется сообщением
+            plan_placeholder = st.empty()
+            try:
+                with plan_placeholder.container():
+                    plan = st.write_stream(generate_content_plan(
+                        st.session_state.brand_profile,
+                        period,
+                        post_count
+                    ))
+            except GenerationError as e:
+                plan_placeholder.error(str(e))
+            else:
+                st.success("✅ Контент-план готов!")
                 
-                if plan and not plan.startswith("Ошибка"):
-                    st.success("✅ Контент-план готов!")
-                    st.text_area(
-                        "Ваш контент-план:",
-                        value=plan,
-                        height=500,
-                        label_visibility="collapsed"
-                    )
-                    
-                    # Кнопка для копирования
-                    st.code(plan, language=None)
-                else:
-                    st.error(plan)
+                # Кнопка для копирования
+                st.code(plan, language=None)
 
 # Футер
 st.divider()
@@ -2,43 +2,122 @@
 Модуль для работы с данными о бренде компании.
 Сохраняет и загружает профиль компании в JSON файл.
 """
+import functools
 import json
 import os
+import stat
+import tempfile
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
 
 BRAND_PROFILE_FILE = "brand_profile.json"
 
 
+# Разобранный профиль по ключу (путь, mtime, inode, размер файла):
+# пока файл не изменился, повторная загрузка не читает его с диска
+_profile_cache = {}
+
+
 def load_brand_profile():
     """
     Загружает профиль бренда из файла.
     
+    Результат кэшируется до изменения файла (по времени модификации, inode и размеру).
+    
     Returns:
         dict: Словарь с данными о бренде или пустой словарь, если файл не существует.
     """
-    if os.path.exists(BRAND_PROFILE_FILE):
+    try:
+        st = os.stat(BRAND_PROFILE_FILE)
+    except OSError:
+        return {}
+    # Сохранение заменяет файл через os.replace, поэтому новый файл получает новый inode:
+    # изменение видно, даже если mtime совпал из-за грубой точности временных меток
+    key = (BRAND_PROFILE_FILE, st.st_mtime_ns, st.st_ino, st.st_size)
+    
+    if key not in _profile_cache:
         try:
-            with open(BRAND_PROFILE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
+            with open(BRAND_PROFILE_FILE, 'rb') as f:
+                data = f.read()
+            profile = orjson.loads(data) if orjson is not None else json.loads(data.decode('utf-8'))
+        except (ValueError, IOError):
             return {}
-    return {}
+        _profile_cache.clear()
+        _profile_cache[key] = profile
+    
+    return dict(_profile_cache[key])
+
+
+def _file_mode(path):
+    """
+    Права для файла, который заменяется через os.replace: как у существующего
+    файла или, если его еще нет, обычные права нового файла с учетом umask
+    (mkstemp создает временный файл с правами 0600).
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
 
 
 def save_brand_profile(profile_data):
     """
     Сохраняет профиль бренда в файл.
     
+    Файл записывается атомарно: сначала во временный файл, затем он
+    заменяет основной, поэтому сбой во время записи не портит профиль.
+    
     Args:
         profile_data (dict): Словарь с данными о бренде для сохранения.
     """
+    if orjson is not None:
+        data = orjson.dumps(profile_data, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(profile_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    # У каждой записи свой временный файл: параллельные сохранения не мешают друг другу
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(BRAND_PROFILE_FILE)),
+            prefix=os.path.basename(BRAND_PROFILE_FILE) + '.',
+            suffix='.tmp',
+        )
+    except OSError:
+        return False
     try:
-        with open(BRAND_PROFILE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(profile_data, f, ensure_ascii=False, indent=2)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _file_mode(BRAND_PROFILE_FILE))
+        os.replace(tmp_path, BRAND_PROFILE_FILE)
         return True
-    except IOError:
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return False
 
 
+# Поля профиля и их подписи в контексте для AI (в порядке вывода)
+_FIELDS = [
+    ('company_name', "Название компании"),
+    ('company_description', "Описание компании"),
+    ('target_audience', "Целевая аудитория"),
+    ('tone_of_voice', "Тональность общения"),
+    ('brand_values', "Ценности бренда"),
+    ('key_messages', "Ключевые сообщения"),
+]
+
+_EMPTY_CONTEXT = "Информация о бренде не заполнена."
+
+
 def get_brand_context_string(profile_data):
     """
     Преобразует данные профиля в строку для использования в промптах AI.
@@ -50,26 +129,18 @@ def get_brand_context_string(profile_data):
         str: Отформатированная строка с контекстом бренда.
     """
     if not profile_data:
-        return "Информация о бренде не заполнена."
-    
-    context_parts = []
-    
-    if profile_data.get('company_name'):
-        context_parts.append(f"Название компании: {profile_data['company_name']}")
-    
-    if profile_data.get('company_description'):
-        context_parts.append(f"Описание компании: {profile_data['company_description']}")
-    
-    if profile_data.get('target_audience'):
-        context_parts.append(f"Целевая аудитория: {profile_data['target_audience']}")
-    
-    if profile_data.get('tone_of_voice'):
-        context_parts.append(f"Тональность общения: {profile_data['tone_of_voice']}")
-    
-    if profile_data.get('brand_values'):
-        context_parts.append(f"Ценности бренда: {profile_data['brand_values']}")
-    
-    if profile_data.get('key_messages'):
-        context_parts.append(f"Ключевые сообщения: {profile_data['key_messages']}")
-    
-    return "\n".join(context_parts) if context_parts else "Информация о бренде не заполнена."
+        return _EMPTY_CONTEXT
+    # Ключ кэша - только значения полей контекста; значения приводятся к строке,
+    # как при форматировании, поэтому нехешируемые значения (списки) тоже подходят
+    return _build_brand_context(tuple(
+        str(profile_data[field]) if profile_data.get(field) else '' for field, _ in _FIELDS
+    ))
+
+
+@functools.lru_cache(maxsize=16)
+def _build_brand_context(values):
+    """Строит строку контекста из значений полей профиля в порядке _FIELDS."""
+    context = "\n".join(
+        f"{label}: {value}" for (_, label), value in zip(_FIELDS, values) if value
+    )
+    return context or _EMPTY_CONTEXT
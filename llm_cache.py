@@ -0,0 +1,280 @@
+"""
+Модуль кэширования ответов LLM.
+Хранит ответы модели по ключу sha256(модель + промпт), чтобы одинаковые
+запросы не отправлялись в API повторно, а также семантический кэш по
+эмбеддингам для близких по смыслу запросов.
+"""
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+LLM_CACHE_FILE = "llm_cache.db"
+SEMANTIC_CACHE_FILE = "semantic_cache.npz"
+
+
+def cache_key(model, prompt):
+    """
+    Вычисляет ключ кэша для пары модель + промпт.
+
+    Args:
+        model (str): Имя модели.
+        prompt (str): Текст промпта.
+
+    Returns:
+        str: Hex-строка SHA-256.
+    """
+    payload = json.dumps({"m": model, "p": prompt}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _file_mode(path):
+    """
+    Права для файла, который заменяется через os.replace: как у существующего
+    файла или, если его еще нет, обычные права нового файла с учетом umask
+    (mkstemp создает временный файл с правами 0600).
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+class LLMCache:
+    """
+    Кэш ответов модели: LRU в памяти поверх SQLite файла.
+
+    SQLite (в режиме WAL) сохраняет ответы между перезапусками и делает их
+    общими для всех сессий и процессов приложения.
+
+    Args:
+        path (str): Путь к файлу базы кэша (None - только в памяти).
+        ttl (int): Время жизни записи в секундах.
+        maxsize (int): Максимальное количество записей в памяти.
+    """
+
+    def __init__(self, path=LLM_CACHE_FILE, ttl=3600, maxsize=512):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def get(self, key):
+        """Возвращает сохраненный ответ или None, если записи нет или она устарела."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                entry = self._db_get(key, now)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Сохраняет ответ в кэш и в базу на диске."""
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, (expires, value))
+            self._db_set(key, expires, value)
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _connect(self):
+        if not self.path:
+            return None
+        try:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+            conn.execute("DELETE FROM llm_cache WHERE expires <= ?", (time.time(),))
+            return conn
+        except sqlite3.Error:
+            return None
+
+    def _db_get(self, key, now):
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute(
+                "SELECT expires, value FROM llm_cache WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return tuple(row) if row else None
+
+    def _db_set(self, key, expires, value):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires) VALUES (?, ?, ?)", (key, value, expires)
+            )
+        except sqlite3.Error:
+            pass
+
+
+class SemanticCache:
+    """
+    Семантический кэш: возвращает сохраненный ответ для текста,
+    эмбеддинг которого близок к уже встречавшемуся в том же разделе.
+
+    Раздел - точный ключ всех остальных параметров запроса (модель,
+    контекст, настройки), поэтому сравниваются только изменяемые части.
+    Эмбеддинги нормализуются при добавлении и хранятся в заранее выделенном
+    массиве, поэтому поиск сводится к одному матрично-векторному произведению.
+    На диск кэш записывается не чаще раза в save_interval секунд и при
+    завершении процесса.
+
+    Args:
+        path (str): Путь к .npz файлу кэша (None - только в памяти).
+        threshold (float): Минимальное косинусное сходство для попадания.
+        dim (int): Размерность эмбеддингов.
+        ttl (int): Время жизни записи в секундах.
+        maxsize (int): Максимальное количество записей.
+        save_interval (int): Минимальный интервал между записями на диск в секундах.
+    """
+
+    def __init__(self, path=SEMANTIC_CACHE_FILE, threshold=0.92, dim=768, ttl=3600, maxsize=1024, save_interval=60):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.save_interval = save_interval
+        self.stats = {"hits": 0, "misses": 0}
+        self._embeddings = np.zeros((maxsize, dim), dtype=np.float32)
+        self._partitions = np.full(maxsize, '', dtype='<U64')
+        self._expires = np.zeros(maxsize, dtype=np.float64)
+        self._responses = [None] * maxsize
+        self._dirty = False
+        self._saved_at = time.time()
+        self._lock = threading.Lock()
+        self._load()
+        if self.path:
+            atexit.register(self.flush)
+
+    def _normalize(self, embedding):
+        """Нормализует эмбеддинг; возвращает None, если его размерность не совпадает с dim."""
+        try:
+            vector = np.asarray(embedding, dtype=np.float32)
+        except (TypeError, ValueError):
+            return None
+        if vector.shape != self._embeddings.shape[1:]:
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, partition, embedding):
+        """
+        Возвращает ответ для самого похожего текста раздела или None, если сходство
+        ниже порога. Эмбеддинг другой размерности считается промахом.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            rows = np.flatnonzero((self._partitions == partition) & (self._expires > time.time()))
+            if vector is None or not len(rows):
+                self.stats["misses"] += 1
+                return None
+            sims = self._embeddings[rows] @ vector
+            best = int(np.argmax(sims))
+            if sims[best] > self.threshold:
+                self.stats["hits"] += 1
+                return self._responses[rows[best]]
+            self.stats["misses"] += 1
+            return None
+
+    def add(self, partition, embedding, response, ttl=None):
+        """
+        Добавляет эмбеддинг с ответом в раздел, вытесняя самую старую запись.
+        Эмбеддинг другой размерности не сохраняется.
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        with self._lock:
+            # Свободные и устаревшие строки имеют наименьший срок жизни
+            row = int(np.argmin(self._expires))
+            self._embeddings[row] = vector
+            self._partitions[row] = partition
+            self._expires[row] = time.time() + (self.ttl if ttl is None else ttl)
+            self._responses[row] = response
+            self._dirty = True
+            if time.time() - self._saved_at >= self.save_interval:
+                self._save()
+
+    def flush(self):
+        """Записывает несохраненные изменения на диск."""
+        with self._lock:
+            self._save()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                embeddings = data['embeddings'].astype(np.float32)
+                partitions = data['partitions']
+                expires = data['expires']
+                responses = [str(r) for r in data['responses']]
+        except (IOError, KeyError, ValueError):
+            return
+        if embeddings.shape[1:] != self._embeddings.shape[1:]:
+            return
+        # Оставляем самые свежие действующие записи, которые помещаются в кэш
+        order = [i for i in np.argsort(-expires) if expires[i] > time.time()][:self.maxsize]
+        for row, i in enumerate(order):
+            self._embeddings[row] = embeddings[i]
+            self._partitions[row] = partitions[i]
+            self._expires[row] = expires[i]
+            self._responses[row] = responses[i]
+
+    def _save(self):
+        if not self.path or not self._dirty:
+            return
+        rows = np.flatnonzero(self._expires > time.time())
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.npz')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    embeddings=self._embeddings[rows],
+                    partitions=self._partitions[rows],
+                    expires=self._expires[rows],
+                    responses=np.array([self._responses[i] for i in rows], dtype=str),
+                )
+            os.chmod(tmp_path, _file_mode(self.path))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved_at = time.time()
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass